@@ -1,7 +1,18 @@
 import boto3
-from datetime import datetime, timedelta
+from botocore.config import Config
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 import json
-from typing import List, Tuple, Dict, Any
+import logging
+import os
+import threading
+import time
+import uuid
+from string import Formatter
+from types import MappingProxyType
+from typing import List, Tuple, Dict, Any, Optional, NamedTuple
 
 # Configuration
 REGION = 'eu-west-2'
@@ -11,290 +22,673 @@ CPU_LOOKBACK_DAYS = 7
 EBS_SNAPSHOT_AGE_DAYS = 30
 RDS_CPU_THRESHOLD = 10     
 NETWORK_THRESHOLD = 1000   
+METRIC_DATA_MAX_QUERIES = 500  # GetMetricData limit per request
+CLOUDWATCH_MAX_CONCURRENCY = 10  # In-flight GetMetricData requests, well under the 50 TPS quota
+# 1 for each period where either network direction reached the threshold
+NETWORK_ACTIVE_EXPRESSION = (
+    f"IF({{NetworkIn}} >= {NETWORK_THRESHOLD} OR {{NetworkOut}} >= {NETWORK_THRESHOLD}, 1, 0)"
+)
+METRIC_CACHE_TABLE = os.environ.get('METRIC_CACHE_TABLE', '')
+METRIC_CACHE_TTL_SECONDS = 6 * 3600
+METRIC_CACHE_BATCH_SIZE = 100  # BatchGetItem limit per request
+METRIC_CACHE_WRITE_BATCH_SIZE = 25  # BatchWriteItem limit per request
+METRIC_CACHE_WRITE_ATTEMPTS = 3
+REGION_QUEUE_URL = os.environ.get('REGION_QUEUE_URL', '')
+REPORT_TABLE = os.environ.get('REPORT_TABLE', '')
+REPORT_TTL_SECONDS = 7 * 86400
+SQS_MAX_BATCH_SIZE = 10  # SendMessageBatch limit per request
+SQS_SEND_ATTEMPTS = 3
+# Resources listed per report section; keeps SNS messages (256 KB) and stored
+# region reports (400 KB DynamoDB items) bounded
+REPORT_SECTION_LIMIT = 100
+PUBLISH_LEASE_SECONDS = 15 * 60  # Longest a worker can hold the publish claim
 
-# Clients
-ec2 = boto3.client('ec2', region_name=REGION)
-cloudwatch = boto3.client('cloudwatch', region_name=REGION)
-sns = boto3.client('sns', region_name=REGION)
-rds = boto3.client('rds', region_name=REGION)
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Clients share one session; adaptive retries back off client-side when throttled
+_session = boto3.session.Session(region_name=REGION)
+_config = Config(
+    max_pool_connections=50,
+    retries={'mode': 'adaptive', 'max_attempts': 5}
+)
+_client_lock = threading.Lock()
+sns = _session.client('sns', config=_config)
+sqs = _session.client('sqs', config=_config)
+dynamodb = _session.resource('dynamodb', config=_config)
+# Resources are not thread-safe, so the metric cache (used from the concurrent
+# checks) goes through a low-level client instead
+dynamodb_client = _session.client('dynamodb', config=_config)
+
+@lru_cache(maxsize=None)
+def get_client(service: str, region: str = REGION):
+    """Get a client for a scanned region, created once per container."""
+    # Client creation on a shared session is not thread-safe
+    with _client_lock:
+        return _session.client(service, region_name=region, config=_config)
+
+# Caps concurrent GetMetricData requests across all checks; throttled calls are
+# retried with backoff by the adaptive retry mode above
+_cloudwatch_slots = threading.BoundedSemaphore(CLOUDWATCH_MAX_CONCURRENCY)
+
+# Metric averages kept for warm invocations: cache key -> (average, expiry timestamp)
+_metric_cache: Dict[str, Tuple[float, float]] = {}
 
 def get_instance_tags(instance: Dict[str, Any]) -> Dict[str, str]:
-    """Extract tags from an EC2 instance."""
+    """Extract tags from an EC2 instance, volume or snapshot."""
     return {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
 
-def get_metric_average(namespace: str, metric_name: str, dimensions: List[Dict], 
-                      days_back: int = CPU_LOOKBACK_DAYS) -> float:
-    """Get average metric value over specified period."""
+def metric_cache_key(region: str, namespace: str, resource_id: str, metric_name: str,
+                     days_back: int) -> str:
+    """Build the cache key for a resource metric average."""
+    return f"{region}|{namespace}|{resource_id}|{metric_name}|{days_back}"
+
+def get_cached_metrics(keys: List[str]) -> Dict[str, float]:
+    """Look up cached metric averages, in-process first and then DynamoDB."""
+    now = time.time()
+    cached = {}
+    missing = []
+    
+    for key in keys:
+        entry = _metric_cache.get(key)
+        if entry and entry[1] > now:
+            cached[key] = entry[0]
+        else:
+            # Drop expired entries so the cache doesn't grow across warm invocations
+            _metric_cache.pop(key, None)
+            missing.append(key)
+    
+    if not METRIC_CACHE_TABLE or not missing:
+        return cached
+    
     try:
-        response = cloudwatch.get_metric_statistics(
-            Namespace=namespace,
-            MetricName=metric_name,
-            Dimensions=dimensions,
-            StartTime=datetime.utcnow() - timedelta(days=days_back),
-            EndTime=datetime.utcnow(),
-            Period=86400,  # Daily
-            Statistics=['Average']
-        )
-        
-        datapoints = response.get('Datapoints', [])
-        if not datapoints:
-            return 0.0
-            
-        return sum(dp['Average'] for dp in datapoints) / len(datapoints)
+        for i in range(0, len(missing), METRIC_CACHE_BATCH_SIZE):
+            response = dynamodb_client.batch_get_item(RequestItems={
+                METRIC_CACHE_TABLE: {
+                    'Keys': [{'pk': {'S': key}} for key in missing[i:i + METRIC_CACHE_BATCH_SIZE]]
+                }
+            })
+            # Unprocessed keys are treated as misses and fetched from CloudWatch
+            for item in response['Responses'].get(METRIC_CACHE_TABLE, []):
+                expires = int(item['exp']['N'])
+                # TTL deletion is lazy, so expired items can still be returned
+                if expires > now:
+                    average = float(item['avg']['N'])
+                    cached[item['pk']['S']] = average
+                    _metric_cache[item['pk']['S']] = (average, expires)
+    except Exception as e:
+        logger.error("Error reading metric cache: %s", e)
+    
+    return cached
+
+def put_cached_metrics(averages: Dict[str, float]):
+    """Store metric averages in the in-process cache and DynamoDB."""
+    expires = int(time.time()) + METRIC_CACHE_TTL_SECONDS
+    for key, average in averages.items():
+        _metric_cache[key] = (average, expires)
+    
+    if not METRIC_CACHE_TABLE or not averages:
+        return
+    
+    requests = [
+        {'PutRequest': {'Item': {
+            'pk': {'S': key},
+            'avg': {'N': f"{average:.6f}"},
+            'exp': {'N': str(expires)}
+        }}}
+        for key, average in averages.items()
+    ]
+    
+    try:
+        for i in range(0, len(requests), METRIC_CACHE_WRITE_BATCH_SIZE):
+            pending = {METRIC_CACHE_TABLE: requests[i:i + METRIC_CACHE_WRITE_BATCH_SIZE]}
+            for attempt in range(METRIC_CACHE_WRITE_ATTEMPTS):
+                if attempt:
+                    time.sleep(0.1 * 2 ** attempt)
+                pending = dynamodb_client.batch_write_item(RequestItems=pending).get('UnprocessedItems')
+                if not pending:
+                    break
+            # Anything still unprocessed is simply refetched from CloudWatch next run
     except Exception as e:
-        print(f"Error getting metrics: {e}")
-        return 0.0
+        logger.error("Error writing metric cache: %s", e)
+
+def build_metric_query(query_id: str, namespace: str, dimension_name: str, resource_id: str,
+                       metric_name: str, period: int, return_data: bool = True) -> Dict[str, Any]:
+    """Build a GetMetricData query for one resource metric."""
+    return {
+        'Id': query_id,
+        'MetricStat': {
+            'Metric': {
+                'Namespace': namespace,
+                'MetricName': metric_name,
+                'Dimensions': [{'Name': dimension_name, 'Value': resource_id}]
+            },
+            'Period': period,
+            'Stat': 'Average'
+        },
+        'ReturnData': return_data
+    }
+
+def fetch_metric_batch(batch: List[Dict[str, Any]], start_time: datetime,
+                       end_time: datetime, region: str = REGION) -> Dict[str, List[float]]:
+    """Run one GetMetricData batch and return the running sum and count per query id."""
+    totals: Dict[str, List[float]] = {}
+    
+    # Shared by every caller, so concurrent checks together stay under the limit
+    with _cloudwatch_slots:
+        for page in get_client('cloudwatch', region).get_paginator('get_metric_data').paginate(
+            MetricDataQueries=batch,
+            StartTime=start_time,
+            EndTime=end_time
+        ):
+            # Datapoints for one query can be split across pages
+            for result in page['MetricDataResults']:
+                datapoints = result['Values']
+                total = totals.setdefault(result['Id'], [0.0, 0])
+                total[0] += sum(datapoints)
+                total[1] += len(datapoints)
+    
+    return totals
+
+def get_metric_averages(namespace: str, dimension_name: str, resource_ids: List[str],
+                        metric_names: List[str], end_time: datetime,
+                        days_back: int = CPU_LOOKBACK_DAYS,
+                        expressions: Optional[Dict[str, str]] = None,
+                        region: str = REGION) -> Dict[str, Dict[str, float]]:
+    """Get average metric values for many resources using batched GetMetricData calls.
+    
+    expressions maps a result name to a metric math template whose {MetricName}
+    fields are filled with that resource's query ids; input metrics not listed
+    in metric_names are fetched with ReturnData=False.
+    """
+    expressions = expressions or {}
+    names = list(metric_names) + list(expressions)
+    # One period spanning the whole window, so CloudWatch returns the average directly
+    period = days_back * 86400
+    averages = {resource_id: {name: 0.0 for name in names} for resource_id in resource_ids}
+    # Queries are grouped per resource so an expression and its inputs share a request
+    query_groups = []
+    query_targets = {}
+    query_count = 0
+    
+    cache_keys = {
+        (resource_id, name): metric_cache_key(region, namespace, resource_id, name, days_back)
+        for resource_id in resource_ids
+        for name in names
+    }
+    cached = get_cached_metrics(list(cache_keys.values()))
+    
+    for resource_id in resource_ids:
+        group = []
+        metric_ids = {}
+        missing = []
+        
+        for name in names:
+            key = cache_keys[(resource_id, name)]
+            if key in cached:
+                averages[resource_id][name] = cached[key]
+            else:
+                missing.append(name)
+        
+        for name in missing:
+            if name not in expressions:
+                query_id = f"m{query_count + len(group)}"
+                metric_ids[name] = query_id
+                query_targets[query_id] = (resource_id, name)
+                group.append(build_metric_query(
+                    query_id, namespace, dimension_name, resource_id, name, period
+                ))
+        
+        for name in missing:
+            if name not in expressions:
+                continue
+            template = expressions[name]
+            for _, input_name, _, _ in Formatter().parse(template):
+                if input_name and input_name not in metric_ids:
+                    input_id = f"m{query_count + len(group)}"
+                    metric_ids[input_name] = input_id
+                    group.append(build_metric_query(
+                        input_id, namespace, dimension_name, resource_id, input_name, period,
+                        return_data=False
+                    ))
+            query_id = f"e{query_count + len(group)}"
+            query_targets[query_id] = (resource_id, name)
+            group.append({'Id': query_id, 'Expression': template.format(**metric_ids)})
+        
+        if group:
+            query_groups.append(group)
+            query_count += len(group)
+    
+    batches = [[]]
+    for group in query_groups:
+        if len(batches[-1]) + len(group) > METRIC_DATA_MAX_QUERIES:
+            batches.append([])
+        batches[-1].extend(group)
+    batches = [batch for batch in batches if batch]
+    
+    # Align the window to the hour so it is exactly one period long; otherwise the
+    # seconds CloudWatch adds when rounding StartTime down come back as a second bucket
+    end_time = end_time.replace(minute=0, second=0, microsecond=0)
+    start_time = end_time - timedelta(days=days_back)
+    # Running sum and datapoint count per query id
+    totals: Dict[str, List[float]] = {}
+    
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(CLOUDWATCH_MAX_CONCURRENCY, len(batches))) as executor:
+            futures = [
+                executor.submit(fetch_metric_batch, batch, start_time, end_time, region)
+                for batch in batches
+            ]
+            # Keep results from the batches that succeeded
+            for future in futures:
+                try:
+                    totals.update(future.result())
+                except Exception as e:
+                    logger.error("Error getting metrics: %s", e)
+    
+    # Only results actually returned are cached, so failed lookups are retried next run
+    fetched = {}
+    for query_id, (total, count) in totals.items():
+        resource_id, name = query_targets[query_id]
+        average = total / count if count else 0.0
+        averages[resource_id][name] = average
+        fetched[cache_keys[(resource_id, name)]] = average
+    put_cached_metrics(fetched)
+    
+    return averages
+
+
+########################################################################################
+# Report records
+########################################################################################
+class UnderutilizedEC2(NamedTuple):
+    instance_id: str
+    cpu: float
+    instance_type: str
+    name: str
+    region: str
+
+class UnderutilizedRDS(NamedTuple):
+    db_id: str
+    cpu: float
+    db_class: str
+    region: str
+
+class OldSnapshot(NamedTuple):
+    snapshot_id: str
+    age: int
+    name: str
+    size: str
+    region: str
+
+class UnattachedVolume(NamedTuple):
+    volume_id: str
+    size: str
+    name: str
+    region: str
 
 
 ########################################################################################
 # EC2 functions
 ########################################################################################
-def check_underutilized_ec2() -> List[Tuple[str, float, str, Dict[str, str]]]:
+def check_underutilized_ec2(now: datetime, region: str = REGION) -> List[UnderutilizedEC2]:
     """Check for underutilized EC2 instances with enhanced metrics."""
-    print("Checking underutilized EC2 instances...")
+    logger.info("Checking underutilized EC2 instances...")
     underutilized = []
     
     try:
-        instances = ec2.describe_instances(
-            Filters=[{'Name': 'instance-state-name', 'Values': ['running']}]
+        pages = get_client('ec2', region).get_paginator('describe_instances').paginate(
+            Filters=[{'Name': 'instance-state-name', 'Values': ['running']}],
+            PaginationConfig={'PageSize': 1000}
         )
         
-        for reservation in instances['Reservations']:
-            for instance in reservation['Instances']:
-                instance_id = instance['InstanceId']
-                instance_type = instance['InstanceType']
-                tags = get_instance_tags(instance)
-                
-                # Skip if marked to ignore
-                if tags.get('CostOptimization') == 'Ignore':
-                    continue
-                
-                # Get CPU utilization
-                cpu_avg = get_metric_average(
-                    'AWS/EC2', 'CPUUtilization',
-                    [{'Name': 'InstanceId', 'Value': instance_id}]
-                )
-                
-                # Get network utilization
-                network_in = get_metric_average(
-                    'AWS/EC2', 'NetworkIn',
-                    [{'Name': 'InstanceId', 'Value': instance_id}]
-                )
-                
-                network_out = get_metric_average(
-                    'AWS/EC2', 'NetworkOut',
-                    [{'Name': 'InstanceId', 'Value': instance_id}]
-                )
-                
-                # Consider underutilized if low CPU AND low network
-                if (cpu_avg < EC2_CPU_THRESHOLD and 
-                    network_in < NETWORK_THRESHOLD and 
-                    network_out < NETWORK_THRESHOLD):
+        candidates = []
+        for page in pages:
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    tags = get_instance_tags(instance)
                     
-                    underutilized.append((
-                        instance_id, 
-                        round(cpu_avg, 2), 
-                        instance_type,
-                        tags
-                    ))
+                    # Skip if marked to ignore
+                    if tags.get('CostOptimization') == 'Ignore':
+                        continue
                     
+                    # Only the Name tag is reported, so don't keep the full tag dict
+                    candidates.append((
+                        instance['InstanceId'],
+                        instance['InstanceType'],
+                        tags.get('Name', 'Unnamed')
+                    ))
+        
+        # Nothing running, so skip the metric lookups entirely
+        if not candidates:
+            return underutilized
+        
+        # CPU and network utilization for all instances in batched requests;
+        # the network thresholds are evaluated by CloudWatch metric math
+        metrics = get_metric_averages(
+            'AWS/EC2', 'InstanceId',
+            [instance_id for instance_id, _, _ in candidates],
+            ['CPUUtilization'],
+            now,
+            expressions={'NetworkActive': NETWORK_ACTIVE_EXPRESSION},
+            region=region
+        )
+        
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for instance_id, instance_type, name in candidates:
+            cpu_avg = metrics[instance_id]['CPUUtilization']
+            network_active = metrics[instance_id]['NetworkActive']
+            if debug:
+                logger.debug("EC2 %s: avg CPU %.2f%%, network active %.2f",
+                             instance_id, cpu_avg, network_active)
+            
+            # Consider underutilized if low CPU AND low network
+            if cpu_avg < EC2_CPU_THRESHOLD and not network_active:
+                
+                underutilized.append(UnderutilizedEC2(
+                    instance_id, 
+                    round(cpu_avg, 2), 
+                    instance_type,
+                    name,
+                    region
+                ))
+                
     except Exception as e:
-        print(f"Error checking EC2 instances: {e}")
+        logger.error("Error checking EC2 instances: %s", e)
     return underutilized
 
 #######################################################################################
 # RDS and EBS functions
 ####################################################################################
-def check_underutilized_rds() -> List[Tuple[str, float, str]]:
+def check_underutilized_rds(now: datetime, region: str = REGION) -> List[UnderutilizedRDS]:
     """Check for underutilized RDS instances."""
-    print("Checking underutilized RDS instances...")
+    logger.info("Checking underutilized RDS instances...")
     underutilized = []
     
     try:
-        db_instances = rds.describe_db_instances()
+        pages = get_client('rds', region).get_paginator('describe_db_instances').paginate()
         
-        for db in db_instances['DBInstances']:
-            if db['DBInstanceStatus'] != 'available':
-                continue
-                
-            db_id = db['DBInstanceIdentifier']
-            db_class = db['DBInstanceClass']
-            
-            cpu_avg = get_metric_average(
-                'AWS/RDS', 'CPUUtilization',
-                [{'Name': 'DBInstanceIdentifier', 'Value': db_id}]
-            )
+        candidates = [
+            (db['DBInstanceIdentifier'], db['DBInstanceClass'])
+            for page in pages
+            for db in page['DBInstances']
+            if db['DBInstanceStatus'] == 'available'
+        ]
+        
+        if not candidates:
+            return underutilized
+        
+        metrics = get_metric_averages(
+            'AWS/RDS', 'DBInstanceIdentifier',
+            [db_id for db_id, _ in candidates],
+            ['CPUUtilization'],
+            now,
+            region=region
+        )
+        
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for db_id, db_class in candidates:
+            cpu_avg = metrics[db_id]['CPUUtilization']
+            if debug:
+                logger.debug("RDS %s: avg CPU %.2f%%", db_id, cpu_avg)
             
             if cpu_avg < RDS_CPU_THRESHOLD:
-                underutilized.append((db_id, round(cpu_avg, 2), db_class))
+                underutilized.append(UnderutilizedRDS(db_id, round(cpu_avg, 2), db_class, region))
                 
     except Exception as e:
-        print(f"Error checking RDS instances: {e}")
+        logger.error("Error checking RDS instances: %s", e)
     
     return underutilized
 
 #######################################################################################
 # EBS functions
 #######################################################################################
-def check_old_ebs_snapshots() -> List[Tuple[str, int, str, str]]:
+# Snapshots carrying any of these tag keys are never reported
+_KEEP_TAGS = frozenset({'DoNotDelete', 'Keep', 'Backup'})
+
+def check_old_ebs_snapshots(now: datetime, region: str = REGION) -> List[OldSnapshot]:
     """Check for old EBS snapshots with enhanced info."""
-    print("Checking old EBS snapshots...")
+    logger.info("Checking old EBS snapshots...")
     old_snapshots = []
-    now = datetime.utcnow()
+    now_ts = now.timestamp()
+    # Snapshots started at or before this are more than EBS_SNAPSHOT_AGE_DAYS whole days old
+    cutoff_ts = now_ts - (EBS_SNAPSHOT_AGE_DAYS + 1) * 86400
     
     try:
-        snapshots = ec2.describe_snapshots(OwnerIds=['self'])['Snapshots']
+        pages = get_client('ec2', region).get_paginator('describe_snapshots').paginate(
+            OwnerIds=['self'],
+            PaginationConfig={'PageSize': 1000}
+        )
         
-        for snap in snapshots:
-            snap_id = snap['SnapshotId']
-            start_time = snap['StartTime'].replace(tzinfo=None)
-            age = (now - start_time).days
-            volume_size = snap.get('VolumeSize', 0)
-            
-            tags = {t['Key']: t['Value'] for t in snap.get('Tags', [])}
-            
-            # Skip if marked to keep
-            if any(tag in tags for tag in ['DoNotDelete', 'Keep', 'Backup']):
-                continue
-            
-            if age > EBS_SNAPSHOT_AGE_DAYS:
-                old_snapshots.append((
-                    snap_id, 
-                    age, 
+        for page in pages:
+            for snap in page['Snapshots']:
+                start_ts = snap['StartTime'].timestamp()
+                
+                # Age check first so tags are only built for old snapshots
+                if start_ts > cutoff_ts:
+                    continue
+                
+                tags = get_instance_tags(snap)
+                
+                # Skip if marked to keep
+                if not _KEEP_TAGS.isdisjoint(tags):
+                    continue
+                
+                old_snapshots.append(OldSnapshot(
+                    snap['SnapshotId'], 
+                    int((now_ts - start_ts) // 86400), 
                     tags.get('Name', 'Unnamed'),
-                    f"{volume_size}GB"
+                    f"{snap.get('VolumeSize', 0)}GB",
+                    region
                 ))
                 
     except Exception as e:
-        print(f"Error checking EBS snapshots: {e}")
+        logger.error("Error checking EBS snapshots: %s", e)
     
     return old_snapshots
 
 #######################################################################################
 # Unattached volumes functions
 #######################################################################################
-def check_unattached_volumes() -> List[Tuple[str, str, str]]:
+def check_unattached_volumes(region: str = REGION) -> List[UnattachedVolume]:
     """Check for unattached EBS volumes."""
-    print("Checking unattached EBS volumes...")
+    logger.info("Checking unattached EBS volumes...")
     unattached = []
     
     try:
-        volumes = ec2.describe_volumes(
-            Filters=[{'Name': 'status', 'Values': ['available']}]
+        pages = get_client('ec2', region).get_paginator('describe_volumes').paginate(
+            Filters=[{'Name': 'status', 'Values': ['available']}],
+            PaginationConfig={'PageSize': 500}
         )
         
-        for volume in volumes['Volumes']:
-            volume_id = volume['VolumeId']
-            size = volume['Size']
-            volume_type = volume['VolumeType']
-            
-            tags = {t['Key']: t['Value'] for t in volume.get('Tags', [])}
-            name = tags.get('Name', 'Unnamed')
-            
-            unattached.append((volume_id, f"{size}GB", name))
-            
+        for page in pages:
+            for volume in page['Volumes']:
+                volume_id = volume['VolumeId']
+                size = volume['Size']
+                volume_type = volume['VolumeType']
+                
+                tags = {t['Key']: t['Value'] for t in volume.get('Tags', [])}
+                name = tags.get('Name', 'Unnamed')
+                
+                unattached.append(UnattachedVolume(volume_id, f"{size}GB", name, region))
+                
     except Exception as e:
-        print(f"Error checking EBS volumes: {e}")
+        logger.error("Error checking EBS volumes: %s", e)
     
     return unattached
 
 #######################################################################################
 # Cost estimation functions
 #######################################################################################
-def estimate_monthly_savings(ec2_data: List, rds_data: List, volume_data: List) -> Dict[str, float]:
-    """Estimate potential monthly savings (rough estimates)."""
-    # Rough AWS pricing estimates (USD/month)
-    ec2_pricing = {
-        't2.micro': 8.5, 't2.small': 17, 't2.medium': 34,
-        't3.micro': 7.5, 't3.small': 15, 't3.medium': 30,
-        'm5.large': 70, 'm5.xlarge': 140, 'c5.large': 62
-    }
-    
-    rds_pricing = {
-        'db.t3.micro': 15, 'db.t3.small': 30, 'db.m5.large': 140
-    }
-    
-    ec2_savings = sum(ec2_pricing.get(instance_type, 50) for _, _, instance_type, _ in ec2_data)
-    rds_savings = sum(rds_pricing.get(db_class, 50) for _, _, db_class in rds_data)
-    volume_savings = len(volume_data) * 8  # ~$8/month per 100GB volume
+# Rough AWS pricing estimates (US cents/month), built once per container.
+# Integer cents keep the sums exact; dollars are only computed for the report.
+_EC2_PRICING = MappingProxyType({
+    't2.micro': 850, 't2.small': 1700, 't2.medium': 3400,
+    't3.micro': 750, 't3.small': 1500, 't3.medium': 3000,
+    'm5.large': 7000, 'm5.xlarge': 14000, 'c5.large': 6200
+})
+
+_RDS_PRICING = MappingProxyType({
+    'db.t3.micro': 1500, 'db.t3.small': 3000, 'db.m5.large': 14000
+})
+
+_DEFAULT_INSTANCE_PRICE = 5000
+_VOLUME_PRICE = 800  # ~$8/month per 100GB volume
+
+def estimate_monthly_savings(ec2_data: List[UnderutilizedEC2], rds_data: List[UnderutilizedRDS],
+                             volume_data: List[UnattachedVolume]) -> Dict[str, float]:
+    """Estimate potential monthly savings in USD (rough estimates)."""
+    # Price each distinct type once rather than once per resource
+    ec2_types = Counter(instance.instance_type for instance in ec2_data)
+    rds_classes = Counter(db.db_class for db in rds_data)
+    ec2_cents = sum(_EC2_PRICING.get(instance_type, _DEFAULT_INSTANCE_PRICE) * count
+                    for instance_type, count in ec2_types.items())
+    rds_cents = sum(_RDS_PRICING.get(db_class, _DEFAULT_INSTANCE_PRICE) * count
+                    for db_class, count in rds_classes.items())
+    volume_cents = len(volume_data) * _VOLUME_PRICE
     
     return {
-        'ec2': round(ec2_savings, 2),
-        'rds': round(rds_savings, 2),
-        'storage': round(volume_savings, 2),
-        'total': round(ec2_savings + rds_savings + volume_savings, 2)
+        'ec2': round(ec2_cents / 100, 2),
+        'rds': round(rds_cents / 100, 2),
+        'storage': round(volume_cents / 100, 2),
+        'total': round((ec2_cents + rds_cents + volume_cents) / 100, 2)
     }
 
 #######################################################################################
 # Publish alert functions
 #######################################################################################
-def publish_enhanced_alert(ec2_data: List, rds_data: List, ebs_data: List, volume_data: List):
-    """Publish enhanced alert with cost estimates."""
-    if not any([ec2_data, rds_data, ebs_data, volume_data]):
-        print("No underutilized resources found.")
-        return
-    savings = estimate_monthly_savings(ec2_data, rds_data, volume_data)
-    message = "*AWS Cost Optimization Report*\n"
-    message += f"Estimated Monthly Savings: ${savings['total']}\n\n"
+# Report line templates, bound once and applied to each record
+_EC2_LINE = " - [{0.region}] {0.instance_id} ({0.name}): {0.instance_type}, Avg CPU = {0.cpu}%".format
+_RDS_LINE = " - [{0.region}] {0.db_id}: {0.db_class}, Avg CPU = {0.cpu}%".format
+_VOLUME_LINE = " - [{0.region}] {0.volume_id} ({0.name}): {0.size}".format
+_SNAPSHOT_LINE = " - [{0.region}] {0.snapshot_id} ({0.name}): {0.age} days old, {0.size}".format
+
+def append_section_lines(parts: List[str], line, records: List[Any],
+                         totals: Optional[Dict[str, int]] = None):
+    """Append up to REPORT_SECTION_LIMIT formatted records shared across regions,
+    noting how many were left out of each region.
+    """
+    by_region: Dict[str, List[Any]] = defaultdict(list)
+    for record in records:
+        by_region[record.region].append(record)
+    totals = totals or {}
+    
+    # Fill the smallest regions first so whatever they leave is split among the larger ones
+    shares = {}
+    remaining = REPORT_SECTION_LIMIT
+    ordered = sorted(by_region, key=lambda region: len(by_region[region]))
+    for i, region in enumerate(ordered):
+        shares[region] = min(len(by_region[region]), remaining // (len(ordered) - i))
+        remaining -= shares[region]
+    
+    for region, region_records in by_region.items():
+        shown = region_records[:shares[region]]
+        parts.extend(map(line, shown))
+        total = totals.get(region, len(region_records))
+        if total > len(shown):
+            parts.append(f" - ... and {total - len(shown)} more in {region}")
+
+def publish_enhanced_alert(ec2_data: List[UnderutilizedEC2], rds_data: List[UnderutilizedRDS],
+                           ebs_data: List[OldSnapshot], volume_data: List[UnattachedVolume],
+                           savings: Optional[Dict[str, float]] = None,
+                           totals: Optional[Dict[str, Dict[str, int]]] = None,
+                           unscanned: Optional[List[str]] = None) -> bool:
+    """Publish enhanced alert with cost estimates; returns False if SNS publishing failed.
+    
+    savings and per-region totals override the values derived from the lists, for
+    combined reports whose per-region lists were truncated. unscanned lists regions
+    whose scan never succeeded.
+    """
+    if not any([ec2_data, rds_data, ebs_data, volume_data, unscanned]):
+        logger.info("No underutilized resources found.")
+        return True
+    if savings is None:
+        savings = estimate_monthly_savings(ec2_data, rds_data, volume_data)
+    totals = totals or {}
+    parts = [
+        "*AWS Cost Optimization Report*",
+        f"Estimated Monthly Savings: ${savings['total']:.2f}",
+        ""
+    ]
+    
+    if unscanned:
+        parts.extend((f"Regions not scanned: {', '.join(unscanned)}", ""))
     
     if ec2_data:
-        message += f"underutilized EC2 Instances (${savings['ec2']}/month):\n"
-        for instance_id, cpu, instance_type, tags in ec2_data:
-            name = tags.get('Name', 'Unnamed')
-            message += f" - {instance_id} ({name}): {instance_type}, Avg CPU = {cpu}%\n"
-        message += "\n"
+        parts.append(f"underutilized EC2 Instances (${savings['ec2']:.2f}/month):")
+        append_section_lines(parts, _EC2_LINE, ec2_data, totals.get('ec2'))
+        parts.append("")
     
     if rds_data:
-        message += f"Underutilized RDS Instances (${savings['rds']}/month):\n"
-        for db_id, cpu, db_class in rds_data:
-            message += f" - {db_id}: {db_class}, Avg CPU = {cpu}%\n"
-        message += "\n"
+        parts.append(f"Underutilized RDS Instances (${savings['rds']:.2f}/month):")
+        append_section_lines(parts, _RDS_LINE, rds_data, totals.get('rds'))
+        parts.append("")
     
     if volume_data:
-        message += f"Unattached EBS Volumes (${savings['storage']}/month):\n"
-        for volume_id, size, name in volume_data:
-            message += f" - {volume_id} ({name}): {size}\n"
-        message += "\n"
+        parts.append(f"Unattached EBS Volumes (${savings['storage']:.2f}/month):")
+        append_section_lines(parts, _VOLUME_LINE, volume_data, totals.get('volumes'))
+        parts.append("")
     
     if ebs_data:
-        message += f"Old EBS Snapshots (>{EBS_SNAPSHOT_AGE_DAYS} days):\n"
-        for snap_id, age, name, size in ebs_data:
-            message += f" - {snap_id} ({name}): {age} days old, {size}\n"
+        parts.append(f"Old EBS Snapshots (>{EBS_SNAPSHOT_AGE_DAYS} days):")
+        append_section_lines(parts, _SNAPSHOT_LINE, ebs_data, totals.get('snapshots'))
     
-    message += "\n *Recommendations:*\n"
-    message += "• Review and potentially terminate unused instances\n"
-    message += "• Consider downsizing underutilized resources\n"
-    message += "• Delete old snapshots after verification\n"
-    message += "• Attach or delete unattached volumes\n"
+    parts.extend((
+        "",
+        " *Recommendations:*",
+        "• Review and potentially terminate unused instances",
+        "• Consider downsizing underutilized resources",
+        "• Delete old snapshots after verification",
+        "• Attach or delete unattached volumes"
+    ))
+    message = "\n".join(parts) + "\n"
     
     try:
         sns.publish(
             TopicArn=SNS_TOPIC_ARN,
-            Subject='AWS Cost Optimization Report - Potential Savings: $' + str(savings['total']),
+            Subject=f"AWS Cost Optimization Report - Potential Savings: ${savings['total']:.2f}",
             Message=message
         )
-        print("Enhanced alert sent to SNS.")
+        logger.info("Enhanced alert sent to SNS.")
+        return True
     except Exception as e:
-        print(f"Error sending SNS notification: {e}")
+        logger.error("Error sending SNS notification: %s", e)
+        return False
 
 #######################################################################################
 # Lambda handler
 #######################################################################################
+def run_checks(now: datetime, region: str = REGION) -> Tuple[List[UnderutilizedEC2], List[UnderutilizedRDS],
+                                                           List[OldSnapshot], List[UnattachedVolume]]:
+    """Run every resource check against one region."""
+    # Checks are independent and I/O-bound, so run them concurrently
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        ec2_future = executor.submit(check_underutilized_ec2, now, region)
+        rds_future = executor.submit(check_underutilized_rds, now, region)
+        snapshots_future = executor.submit(check_old_ebs_snapshots, now, region)
+        volumes_future = executor.submit(check_unattached_volumes, region)
+    
+    return (
+        ec2_future.result(),
+        rds_future.result(),
+        snapshots_future.result(),
+        volumes_future.result()
+    )
+
 def lambda_handler(event, context):
     """Enhanced Lambda handler with comprehensive cost optimization checks."""
     try:
-        print("Starting AWS cost optimization analysis...")
+        logger.info("Starting AWS cost optimization analysis...")
         
-        ec2_underused = check_underutilized_ec2()
-        rds_underused = check_underutilized_rds()
-        old_snapshots = check_old_ebs_snapshots()
-        unattached_volumes = check_unattached_volumes()
+        ec2_underused, rds_underused, old_snapshots, unattached_volumes = run_checks(
+            datetime.now(timezone.utc)
+        )
         
-        publish_enhanced_alert(ec2_underused, rds_underused, old_snapshots, unattached_volumes)
+        sent = publish_enhanced_alert(ec2_underused, rds_underused, old_snapshots, unattached_volumes)
         
         # Return summary for Lambda logs
         return {
-            'statusCode': 200,
+            'statusCode': 200 if sent else 500,
             'body': json.dumps({
                 'underutilized_ec2': len(ec2_underused),
                 'underutilized_rds': len(rds_underused),
@@ -304,12 +698,233 @@ def lambda_handler(event, context):
         }
         
     except Exception as e:
-        print(f"Error in lambda_handler: {e}")
+        logger.error("Error in lambda_handler: %s", e)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+
+#######################################################################################
+# Multi-region fan-out handlers
+#######################################################################################
+def queue_regions(run_id: str, regions: List[str]) -> List[str]:
+    """Send one SQS message per region, retrying failures; returns regions never queued."""
+    pending = [
+        {'Id': str(i), 'MessageBody': json.dumps({'run_id': run_id, 'region': region})}
+        for i, region in enumerate(regions)
+    ]
+    
+    for attempt in range(SQS_SEND_ATTEMPTS):
+        if attempt:
+            time.sleep(2 ** attempt)
+        failed = []
+        for i in range(0, len(pending), SQS_MAX_BATCH_SIZE):
+            entries = pending[i:i + SQS_MAX_BATCH_SIZE]
+            try:
+                response = sqs.send_message_batch(QueueUrl=REGION_QUEUE_URL, Entries=entries)
+            except Exception as e:
+                logger.error("Error queueing region messages: %s", e)
+                failed.extend(entries)
+                continue
+            failed_ids = {entry['Id'] for entry in response.get('Failed', [])}
+            for entry in response.get('Failed', []):
+                logger.error("Error queueing region message %s: %s", entry['Id'], entry.get('Message'))
+            failed.extend(entry for entry in entries if entry['Id'] in failed_ids)
+        pending = failed
+        if not pending:
+            break
+    
+    return [regions[int(entry['Id'])] for entry in pending]
+
+def run_complete(run: Dict[str, Any]) -> bool:
+    """Whether every region still in the run has stored its report."""
+    # Regions dropped by the dispatcher may already be in completed, so compare sets;
+    # a run with no regions has no reports to read and nothing to publish.
+    # Dead-lettered regions count as finished so one bad region cannot hold up the run
+    finished = run.get('completed', set()) | run.get('failed', set())
+    return bool(run['regions']) and set(run['regions']) <= finished
+
+def dispatcher_handler(event, context):
+    """Queue one SQS message per enabled region for the worker Lambda."""
+    try:
+        regions = [r['RegionName'] for r in get_client('ec2').describe_regions()['Regions']]
+        run_id = str(uuid.uuid4())
+        logger.info("Dispatching run %s to %d regions", run_id, len(regions))
+        
+        # Record the expected regions before any worker can report back
+        dynamodb.Table(REPORT_TABLE).put_item(Item={
+            'pk': f"{run_id}#run",
+            'regions': regions,
+            'exp': int(time.time()) + REPORT_TTL_SECONDS
+        })
+        
+        unqueued = queue_regions(run_id, regions)
+        if len(unqueued) == len(regions):
+            raise RuntimeError(f"No regions could be queued for run {run_id}")
+        if unqueued:
+            # Drop them from the run so it can still complete with the regions that were queued
+            logger.error("Removing unqueued regions %s from run %s", ", ".join(unqueued), run_id)
+            run = dynamodb.Table(REPORT_TABLE).update_item(
+                Key={'pk': f"{run_id}#run"},
+                UpdateExpression='SET regions = :regions',
+                ExpressionAttributeValues={
+                    ':regions': [region for region in regions if region not in unqueued]
+                },
+                ReturnValues='ALL_NEW'
+            )['Attributes']
+            # Workers may already have finished every remaining region
+            if run_complete(run):
+                publish_run_report(run_id, run)
+            regions = run['regions']
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'run_id': run_id, 'regions': len(regions)})
+        }
+        
+    except Exception as e:
+        logger.error("Error in dispatcher_handler: %s", e)
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
         }
 
+def worker_handler(event, context):
+    """Scan the region named in each SQS record and store its report."""
+    table = dynamodb.Table(REPORT_TABLE)
+    now = datetime.now(timezone.utc)
+    
+    # Errors propagate so SQS redelivers the message
+    for record in event['Records']:
+        message = json.loads(record['body'])
+        run_id, region = message['run_id'], message['region']
+        logger.info("Scanning region %s for run %s", region, run_id)
+        
+        ec2_underused, rds_underused, old_snapshots, unattached_volumes = run_checks(now, region)
+        # Lists are truncated to what the alert can show; totals and savings cover everything
+        table.put_item(Item={
+            'pk': f"{run_id}#{region}",
+            'report': json.dumps({
+                'ec2': ec2_underused[:REPORT_SECTION_LIMIT],
+                'rds': rds_underused[:REPORT_SECTION_LIMIT],
+                'snapshots': old_snapshots[:REPORT_SECTION_LIMIT],
+                'volumes': unattached_volumes[:REPORT_SECTION_LIMIT],
+                'totals': {
+                    'ec2': len(ec2_underused),
+                    'rds': len(rds_underused),
+                    'snapshots': len(old_snapshots),
+                    'volumes': len(unattached_volumes)
+                },
+                'savings': estimate_monthly_savings(ec2_underused, rds_underused, unattached_volumes)
+            }),
+            'exp': int(time.time()) + REPORT_TTL_SECONDS
+        })
+        
+        # A string set keeps redelivered messages from being counted twice
+        run = table.update_item(
+            Key={'pk': f"{run_id}#run"},
+            UpdateExpression='ADD completed :region',
+            ExpressionAttributeValues={':region': {region}},
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+        
+        if run_complete(run):
+            publish_run_report(run_id, run)
+
+def dead_letter_handler(event, context):
+    """Mark regions whose scan was dead-lettered as failed so their run can still publish."""
+    table = dynamodb.Table(REPORT_TABLE)
+    
+    for record in event['Records']:
+        message = json.loads(record['body'])
+        run_id, region = message['run_id'], message['region']
+        logger.error("Region %s was not scanned for run %s", region, run_id)
+        
+        run = table.update_item(
+            Key={'pk': f"{run_id}#run"},
+            UpdateExpression='ADD failed :region',
+            ExpressionAttributeValues={':region': {region}},
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+        
+        if run_complete(run):
+            publish_run_report(run_id, run)
+
+def publish_run_report(run_id: str, run: Dict[str, Any]):
+    """Combine the per-region reports of a finished run into one alert."""
+    table = dynamodb.Table(REPORT_TABLE)
+    key = {'pk': f"{run_id}#run"}
+    now = int(time.time())
+    
+    # Claim the run so only one worker publishes it; the lease lets a redelivered
+    # message take over if the claiming worker dies before releasing it
+    try:
+        table.update_item(
+            Key=key,
+            UpdateExpression='SET publishing_until = :until',
+            ConditionExpression=(
+                'attribute_not_exists(published) AND '
+                '(attribute_not_exists(publishing_until) OR publishing_until < :now)'
+            ),
+            ExpressionAttributeValues={':until': now + PUBLISH_LEASE_SECONDS, ':now': now}
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return
+    
+    completed = run.get('completed', set())
+    regions = [region for region in run['regions'] if region in completed]
+    unscanned = [region for region in run['regions'] if region not in completed]
+    
+    try:
+        ec2_underused, rds_underused, old_snapshots, unattached_volumes = [], [], [], []
+        totals: Dict[str, Dict[str, int]] = defaultdict(dict)
+        savings: Counter = Counter()
+        # Strongly consistent, so reports written just before the run completed are seen
+        request = {REPORT_TABLE: {
+            'Keys': [{'pk': f"{run_id}#{region}"} for region in regions],
+            'ConsistentRead': True
+        }} if regions else None
+        attempt = 0
+        while request:
+            if attempt:
+                # Unprocessed keys mean the table is throttling, so back off before retrying
+                time.sleep(min(0.1 * 2 ** attempt, 5))
+            attempt += 1
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(REPORT_TABLE, []):
+                report = json.loads(item['report'])
+                region = item['pk'].split('#', 1)[1]
+                ec2_underused.extend(UnderutilizedEC2(*row) for row in report['ec2'])
+                rds_underused.extend(UnderutilizedRDS(*row) for row in report['rds'])
+                old_snapshots.extend(OldSnapshot(*row) for row in report['snapshots'])
+                unattached_volumes.extend(UnattachedVolume(*row) for row in report['volumes'])
+                for section, count in report['totals'].items():
+                    totals[section][region] = count
+                savings.update(report['savings'])
+            request = response.get('UnprocessedKeys')
+        
+        logger.info("Publishing run %s across %d regions (%d not scanned)",
+                    run_id, len(regions), len(unscanned))
+        if not publish_enhanced_alert(
+            ec2_underused, rds_underused, old_snapshots, unattached_volumes,
+            # With no reports there is nothing to sum, so derive zeros from the empty lists
+            savings={key: round(value, 2) for key, value in savings.items()} or None,
+            totals=totals,
+            unscanned=unscanned
+        ):
+            raise RuntimeError(f"Failed to publish report for run {run_id}")
+    except Exception:
+        # Release the claim and fail the SQS record so the redelivery publishes instead
+        table.update_item(Key=key, UpdateExpression='REMOVE publishing_until')
+        raise
+    
+    table.update_item(
+        Key=key,
+        UpdateExpression='SET published = :true',
+        ExpressionAttributeValues={':true': True}
+    )
+
 # For local testing
 if __name__ == "__main__":
+    logging.basicConfig()
     lambda_handler({}, {})
\ No newline at end of file
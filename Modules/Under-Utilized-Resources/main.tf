@@ -26,6 +26,103 @@ resource "aws_iam_role_policy_attachment" "policies" {
   policy_arn = each.value
 }
 
+resource "aws_dynamodb_table" "metric_cache" {
+  name         = "${var.lambda_function_name}-metric-cache"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "exp"
+    enabled        = true
+  }
+}
+
+resource "aws_iam_role_policy" "metric_cache" {
+  name = "${var.lambda_function_name}-metric-cache"
+  role = aws_iam_role.lambda_exec_role.id
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Action = [
+        "dynamodb:BatchGetItem",
+        "dynamodb:BatchWriteItem"
+      ],
+      Effect   = "Allow",
+      Resource = aws_dynamodb_table.metric_cache.arn
+    }]
+  })
+}
+
+resource "aws_dynamodb_table" "reports" {
+  name         = "${var.lambda_function_name}-reports"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "exp"
+    enabled        = true
+  }
+}
+
+resource "aws_sqs_queue" "regions_dlq" {
+  name                      = "${var.lambda_function_name}-regions-dlq"
+  message_retention_seconds = 1209600
+}
+
+resource "aws_sqs_queue" "regions" {
+  name = "${var.lambda_function_name}-regions"
+  # AWS recommends six times the consumer function timeout
+  visibility_timeout_seconds = 6 * var.worker_timeout
+
+  # Park region scans that keep failing instead of rerunning them until retention expires
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.regions_dlq.arn
+    maxReceiveCount     = var.worker_max_receive_count
+  })
+}
+
+resource "aws_iam_role_policy" "region_fan_out" {
+  name = "${var.lambda_function_name}-region-fan-out"
+  role = aws_iam_role.lambda_exec_role.id
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Action = [
+          "sqs:SendMessage",
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes"
+        ],
+        Effect = "Allow",
+        Resource = [
+          aws_sqs_queue.regions.arn,
+          aws_sqs_queue.regions_dlq.arn
+        ]
+      },
+      {
+        Action = [
+          "dynamodb:PutItem",
+          "dynamodb:UpdateItem",
+          "dynamodb:BatchGetItem"
+        ],
+        Effect   = "Allow",
+        Resource = aws_dynamodb_table.reports.arn
+      }
+    ]
+  })
+}
+
 resource "aws_sns_topic" "alerts" {
   name = "${var.lambda_function_name}-alerts"
 }
@@ -42,20 +139,96 @@ data "archive_file" "lambda_zip" {
   output_path = "${path.module}/function.zip"
 }
 
+locals {
+  lambda_environment = {
+    SNS_TOPIC_ARN      = aws_sns_topic.alerts.arn
+    METRIC_CACHE_TABLE = aws_dynamodb_table.metric_cache.name
+    REGION_QUEUE_URL   = aws_sqs_queue.regions.url
+    REPORT_TABLE       = aws_dynamodb_table.reports.name
+  }
+}
+
+# Scheduled dispatcher: queues one message per region for the worker
 resource "aws_lambda_function" "cost_optimizer" {
   filename         = data.archive_file.lambda_zip.output_path
   function_name    = var.lambda_function_name
   role             = aws_iam_role.lambda_exec_role.arn
-  handler          = "lambda.lambda_handler"
+  handler          = "lambda.dispatcher_handler"
   runtime          = "python3.9"
   source_code_hash = data.archive_file.lambda_zip.output_base64sha256
   timeout          = 30
 
   environment {
-    variables = {
-      SNS_TOPIC_ARN = aws_sns_topic.alerts.arn
-    }
+    variables = local.lambda_environment
+  }
+}
+
+resource "aws_lambda_function" "region_worker" {
+  filename         = data.archive_file.lambda_zip.output_path
+  function_name    = "${var.lambda_function_name}-worker"
+  role             = aws_iam_role.lambda_exec_role.arn
+  handler          = "lambda.worker_handler"
+  runtime          = "python3.9"
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+  timeout          = var.worker_timeout
+
+  environment {
+    variables = local.lambda_environment
+  }
+}
+
+resource "aws_lambda_event_source_mapping" "regions" {
+  event_source_arn = aws_sqs_queue.regions.arn
+  function_name    = aws_lambda_function.region_worker.arn
+  batch_size       = 1
+
+  scaling_config {
+    maximum_concurrency = var.worker_max_concurrency
+  }
+
+  # Lambda validates queue access when the mapping is created, so the policy must exist first
+  depends_on = [aws_iam_role_policy.region_fan_out]
+}
+
+# Marks dead-lettered regions as failed so their run still publishes
+resource "aws_lambda_function" "dead_letter" {
+  filename         = data.archive_file.lambda_zip.output_path
+  function_name    = "${var.lambda_function_name}-dead-letter"
+  role             = aws_iam_role.lambda_exec_role.arn
+  handler          = "lambda.dead_letter_handler"
+  runtime          = "python3.9"
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+  timeout          = 30
+
+  environment {
+    variables = local.lambda_environment
+  }
+}
+
+resource "aws_lambda_event_source_mapping" "regions_dlq" {
+  event_source_arn = aws_sqs_queue.regions_dlq.arn
+  function_name    = aws_lambda_function.dead_letter.arn
+  batch_size       = 1
+
+  depends_on = [aws_iam_role_policy.region_fan_out]
+}
+
+# Messages only stay visible in the dead-letter queue when the handler cannot process them
+resource "aws_cloudwatch_metric_alarm" "regions_dlq" {
+  alarm_name        = "${var.lambda_function_name}-regions-dlq"
+  alarm_description = "Region scans are stuck in the dead-letter queue"
+  namespace         = "AWS/SQS"
+  metric_name       = "ApproximateNumberOfMessagesVisible"
+  dimensions = {
+    QueueName = aws_sqs_queue.regions_dlq.name
   }
+  statistic           = "Maximum"
+  period              = 300
+  evaluation_periods  = 1
+  comparison_operator = "GreaterThanThreshold"
+  threshold           = 0
+  treat_missing_data  = "notBreaching"
+  alarm_actions       = [aws_sns_topic.alerts.arn]
 }
 
 resource "aws_cloudwatch_event_rule" "trigger" {
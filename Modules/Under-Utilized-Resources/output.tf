@@ -5,3 +5,23 @@ output "sns_topic_arn" {
 output "lambda_name" {
   value = aws_lambda_function.cost_optimizer.function_name
 }
+
+output "metric_cache_table" {
+  value = aws_dynamodb_table.metric_cache.name
+}
+
+output "worker_lambda_name" {
+  value = aws_lambda_function.region_worker.function_name
+}
+
+output "region_queue_url" {
+  value = aws_sqs_queue.regions.url
+}
+
+output "region_dlq_url" {
+  value = aws_sqs_queue.regions_dlq.url
+}
+
+output "dead_letter_lambda_name" {
+  value = aws_lambda_function.dead_letter.function_name
+}
@@ -0,0 +1,319 @@
+"""Region fan-out: dispatcher_handler -> worker_handler -> publish_run_report, against stubbed AWS."""
+import importlib.util
+import json
+from pathlib import Path
+
+import pytest
+from botocore.stub import ANY, Stubber
+
+LAMBDA_PATH = Path(__file__).resolve().parent.parent / 'lambda.py'
+REPORT_TABLE = 'reports'
+QUEUE_URL = 'https://sqs.eu-west-2.amazonaws.com/123456789012/regions'
+RUN_ID = 'run-1'
+RUN_KEY = {'pk': f"{RUN_ID}#run"}
+REGIONS = ['eu-west-1', 'us-east-1']
+
+
+@pytest.fixture
+def lam(monkeypatch):
+    # lambda is a keyword, so the handler module is loaded from its path
+    spec = importlib.util.spec_from_file_location('cost_optimizer', LAMBDA_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, 'REPORT_TABLE', REPORT_TABLE)
+    monkeypatch.setattr(module, 'REGION_QUEUE_URL', QUEUE_URL)
+    monkeypatch.setattr(module.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(module.uuid, 'uuid4', lambda: RUN_ID)
+    return module
+
+
+@pytest.fixture
+def stubs(lam):
+    # The DynamoDB stub sees the resource's Python parameters but returns wire-format responses
+    stubbers = {
+        'dynamodb': Stubber(lam.dynamodb.meta.client),
+        'sqs': Stubber(lam.sqs),
+        'sns': Stubber(lam.sns)
+    }
+    for stubber in stubbers.values():
+        stubber.activate()
+    yield stubbers
+    for stubber in stubbers.values():
+        stubber.assert_no_pending_responses()
+        stubber.deactivate()
+
+
+@pytest.fixture
+def messages(lam):
+    """Alert bodies handed to SNS, whether or not the publish succeeded."""
+    sent = []
+    lam.sns.meta.events.register(
+        'provide-client-params.sns.Publish',
+        lambda params, **kwargs: sent.append(params['Message'])
+    )
+    return sent
+
+
+def findings(lam, region, volumes=1):
+    return (
+        [lam.UnderutilizedEC2(f"i-{region}", 1.0, 't2.micro', 'web', region)],
+        [],
+        [],
+        [lam.UnattachedVolume(f"vol-{region}-{i}", '8GB', 'data', region) for i in range(volumes)]
+    )
+
+
+def use_findings(monkeypatch, lam, results):
+    monkeypatch.setattr(lam, 'run_checks', lambda now, region: results[region])
+
+
+def stored_report(lam, results):
+    ec2, rds, snapshots, volumes = results
+    limit = lam.REPORT_SECTION_LIMIT
+    return json.dumps({
+        'ec2': ec2[:limit],
+        'rds': rds[:limit],
+        'snapshots': snapshots[:limit],
+        'volumes': volumes[:limit],
+        'totals': {
+            'ec2': len(ec2),
+            'rds': len(rds),
+            'snapshots': len(snapshots),
+            'volumes': len(volumes)
+        },
+        'savings': lam.estimate_monthly_savings(ec2, rds, volumes)
+    })
+
+
+def run_attributes(regions, completed=(), failed=(), published=False):
+    attributes = {'pk': {'S': RUN_KEY['pk']}, 'regions': {'L': [{'S': region} for region in regions]}}
+    if completed:
+        attributes['completed'] = {'SS': sorted(completed)}
+    if failed:
+        attributes['failed'] = {'SS': sorted(failed)}
+    if published:
+        attributes['published'] = {'BOOL': True}
+    return attributes
+
+
+def expect_region_stored(stubs, region, report, run):
+    stubs['dynamodb'].add_response('put_item', {}, {
+        'TableName': REPORT_TABLE,
+        'Item': {'pk': f"{RUN_ID}#{region}", 'report': report, 'exp': ANY}
+    })
+    stubs['dynamodb'].add_response('update_item', {'Attributes': run}, {
+        'TableName': REPORT_TABLE,
+        'Key': RUN_KEY,
+        'UpdateExpression': 'ADD completed :region',
+        'ExpressionAttributeValues': {':region': {region}},
+        'ReturnValues': 'ALL_NEW'
+    })
+
+
+def expect_publish(stubs, reports, sns_error=None):
+    """Claim the run, read the given region reports and publish them."""
+    stubs['dynamodb'].add_response('update_item', {}, {
+        'TableName': REPORT_TABLE,
+        'Key': RUN_KEY,
+        'UpdateExpression': 'SET publishing_until = :until',
+        'ConditionExpression': ANY,
+        'ExpressionAttributeValues': ANY
+    })
+    stubs['dynamodb'].add_response('batch_get_item', {
+        'Responses': {REPORT_TABLE: [
+            {'pk': {'S': f"{RUN_ID}#{region}"}, 'report': {'S': report}}
+            for region, report in reports.items()
+        ]}
+    }, {
+        'RequestItems': {REPORT_TABLE: {
+            'Keys': [{'pk': f"{RUN_ID}#{region}"} for region in reports],
+            'ConsistentRead': True
+        }}
+    })
+    if sns_error:
+        stubs['sns'].add_client_error('publish', sns_error)
+        stubs['dynamodb'].add_response('update_item', {}, {
+            'TableName': REPORT_TABLE,
+            'Key': RUN_KEY,
+            'UpdateExpression': 'REMOVE publishing_until'
+        })
+    else:
+        stubs['sns'].add_response('publish', {'MessageId': 'message-1'}, {
+            'TopicArn': ANY,
+            'Subject': ANY,
+            'Message': ANY
+        })
+        stubs['dynamodb'].add_response('update_item', {}, {
+            'TableName': REPORT_TABLE,
+            'Key': RUN_KEY,
+            'UpdateExpression': 'SET published = :true',
+            'ExpressionAttributeValues': {':true': True}
+        })
+
+
+def deliver(lam, region):
+    lam.worker_handler({'Records': [{'body': json.dumps({'run_id': RUN_ID, 'region': region})}]}, None)
+
+
+def dispatch(lam, monkeypatch):
+    ec2 = lam._session.client('ec2')
+    ec2_stub = Stubber(ec2)
+    ec2_stub.add_response('describe_regions', {
+        'Regions': [{'RegionName': region} for region in REGIONS]
+    })
+    monkeypatch.setattr(lam, 'get_client', lambda service, region=None: ec2)
+    with ec2_stub:
+        return lam.dispatcher_handler({}, None)
+
+
+def send_batch(stubs, regions, failed=()):
+    entries = [
+        {'Id': str(REGIONS.index(region)),
+         'MessageBody': json.dumps({'run_id': RUN_ID, 'region': region})}
+        for region in regions
+    ]
+    stubs['sqs'].add_response('send_message_batch', {
+        'Successful': [
+            {'Id': entry['Id'], 'MessageId': f"message-{entry['Id']}", 'MD5OfMessageBody': 'md5'}
+            for entry in entries if entry['Id'] not in failed
+        ],
+        'Failed': [
+            {'Id': entry['Id'], 'SenderFault': False, 'Code': 'InternalError', 'Message': 'boom'}
+            for entry in entries if entry['Id'] in failed
+        ]
+    }, {'QueueUrl': QUEUE_URL, 'Entries': entries})
+
+
+def expect_run_recorded(stubs):
+    stubs['dynamodb'].add_response('put_item', {}, {
+        'TableName': REPORT_TABLE,
+        'Item': {
+            'pk': RUN_KEY['pk'],
+            'regions': REGIONS,
+            'exp': ANY
+        }
+    })
+
+
+def test_dispatcher_retries_failed_sends(lam, stubs, monkeypatch):
+    expect_run_recorded(stubs)
+    send_batch(stubs, REGIONS, failed={'1'})
+    send_batch(stubs, REGIONS[1:])
+
+    response = dispatch(lam, monkeypatch)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body']) == {'run_id': RUN_ID, 'regions': 2}
+
+
+def test_dispatcher_drops_regions_that_never_queue(lam, stubs, monkeypatch):
+    expect_run_recorded(stubs)
+    send_batch(stubs, REGIONS, failed={'1'})
+    for _ in range(lam.SQS_SEND_ATTEMPTS - 1):
+        send_batch(stubs, REGIONS[1:], failed={'1'})
+    stubs['dynamodb'].add_response('update_item', {'Attributes': run_attributes(REGIONS[:1])}, {
+        'TableName': REPORT_TABLE,
+        'Key': RUN_KEY,
+        'UpdateExpression': 'SET regions = :regions',
+        'ExpressionAttributeValues': {':regions': REGIONS[:1]},
+        'ReturnValues': 'ALL_NEW'
+    })
+
+    response = dispatch(lam, monkeypatch)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['regions'] == 1
+
+
+def test_redelivered_record_publishes_once(lam, stubs, messages, monkeypatch):
+    results = {region: findings(lam, region) for region in REGIONS}
+    reports = {region: stored_report(lam, results[region]) for region in REGIONS}
+    use_findings(monkeypatch, lam, results)
+    first, second = REGIONS
+
+    expect_region_stored(stubs, first, reports[first], run_attributes(REGIONS, {first}))
+    expect_region_stored(stubs, first, reports[first], run_attributes(REGIONS, {first}))
+    expect_region_stored(stubs, second, reports[second], run_attributes(REGIONS, REGIONS))
+    expect_publish(stubs, reports)
+    # Redelivered after the run was published: the claim fails and nothing is sent
+    expect_region_stored(stubs, second, reports[second],
+                         run_attributes(REGIONS, REGIONS, published=True))
+    stubs['dynamodb'].add_client_error('update_item', 'ConditionalCheckFailedException')
+
+    for region in (first, first, second, second):
+        deliver(lam, region)
+
+    assert len(messages) == 1
+    assert f" - [{first}] i-{first} (web): t2.micro, Avg CPU = 1.0%" in messages[0].splitlines()
+    assert f" - [{second}] i-{second} (web): t2.micro, Avg CPU = 1.0%" in messages[0].splitlines()
+
+
+def test_failed_sns_publish_is_retried(lam, stubs, messages, monkeypatch):
+    region = REGIONS[0]
+    results = {region: findings(lam, region)}
+    reports = {region: stored_report(lam, results[region])}
+    use_findings(monkeypatch, lam, results)
+
+    expect_region_stored(stubs, region, reports[region], run_attributes([region], {region}))
+    expect_publish(stubs, reports, sns_error='InternalError')
+    expect_region_stored(stubs, region, reports[region], run_attributes([region], {region}))
+    expect_publish(stubs, reports)
+
+    # The first delivery fails so SQS redelivers it
+    with pytest.raises(RuntimeError):
+        deliver(lam, region)
+    deliver(lam, region)
+
+    assert len(messages) == 2
+    assert messages[0] == messages[1]
+
+
+def test_sections_share_the_limit_across_regions(lam, stubs, messages, monkeypatch):
+    limit = lam.REPORT_SECTION_LIMIT
+    results = {region: findings(lam, region, volumes=limit + 50) for region in REGIONS}
+    reports = {region: stored_report(lam, results[region]) for region in REGIONS}
+    use_findings(monkeypatch, lam, results)
+    first, second = REGIONS
+
+    expect_region_stored(stubs, first, reports[first], run_attributes(REGIONS, {first}))
+    expect_region_stored(stubs, second, reports[second], run_attributes(REGIONS, REGIONS))
+    expect_publish(stubs, reports)
+
+    deliver(lam, first)
+    deliver(lam, second)
+
+    assert len(json.loads(reports[first])['volumes']) == limit
+    lines = messages[0].splitlines()
+    for region in REGIONS:
+        shown = [line for line in lines if line.startswith(f" - [{region}] vol-")]
+        assert len(shown) == limit // 2
+        assert f" - ... and {limit + 50 - limit // 2} more in {region}" in lines
+    assert "Unattached EBS Volumes ($2400.00/month):" in lines
+
+
+def test_dead_lettered_region_is_reported_as_not_scanned(lam, stubs, messages, monkeypatch):
+    first, second = REGIONS
+    results = {first: findings(lam, first)}
+    reports = {first: stored_report(lam, results[first])}
+    use_findings(monkeypatch, lam, results)
+
+    expect_region_stored(stubs, first, reports[first], run_attributes(REGIONS, {first}))
+    stubs['dynamodb'].add_response(
+        'update_item',
+        {'Attributes': run_attributes(REGIONS, {first}, failed={second})},
+        {
+            'TableName': REPORT_TABLE,
+            'Key': RUN_KEY,
+            'UpdateExpression': 'ADD failed :region',
+            'ExpressionAttributeValues': {':region': {second}},
+            'ReturnValues': 'ALL_NEW'
+        }
+    )
+    expect_publish(stubs, reports)
+
+    deliver(lam, first)
+    lam.dead_letter_handler(
+        {'Records': [{'body': json.dumps({'run_id': RUN_ID, 'region': second})}]}, None
+    )
+
+    assert f"Regions not scanned: {second}" in messages[0].splitlines()
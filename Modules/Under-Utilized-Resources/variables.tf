@@ -18,3 +18,21 @@ variable "schedule_expression" {
   type        = string
   default     = "cron(0 0 ? * FRI *)"
 }
+
+variable "worker_timeout" {
+  description = "Timeout in seconds for the per-region worker Lambda"
+  type        = number
+  default     = 300
+}
+
+variable "worker_max_concurrency" {
+  description = "Maximum concurrent region scans (minimum 2)"
+  type        = number
+  default     = 10
+}
+
+variable "worker_max_receive_count" {
+  description = "Attempts per region scan before its message moves to the dead-letter queue"
+  type        = number
+  default     = 3
+}